@@ -10,6 +10,7 @@ from js import document, window, Blob, URL, console
 from pyodide.ffi import create_proxy
 import json
 import io
+import re
 
 # Variables globales para almacenar datos
 data_store = {
@@ -19,9 +20,17 @@ data_store = {
     'factors': None,
     'factors_detail': None,
     'df_proy': None,
-    'cohorte_objetivo': None
+    'cohorte_objetivo': None,
+    'volumen': None,
+    'df_cartera': None
 }
 
+# Columna opcional del CSV con el volumen de cada cohorte (ponderación de cartera)
+VOLUME_COLUMN = 'volumen'
+
+# Horizonte de la proyección de cartera (meses calendario tras el último período)
+PORTFOLIO_HORIZON = 12
+
 # ============================================================
 # FUNCIONES DE PROCESAMIENTO
 # ============================================================
@@ -35,15 +44,40 @@ def parse_pct(x):
     return float(x)
 
 
+def parse_volume(x):
+    """Parsea volúmenes con formato español (1.234.567,89) o decimal con punto (1234567.89)"""
+    if pd.isna(x) or x == '':
+        return np.nan
+    if isinstance(x, str):
+        x = x.strip()
+        # El punto es separador de miles sólo si lo siguen grupos de exactamente 3 dígitos
+        if ',' in x or re.fullmatch(r'\d{1,3}(\.\d{3})+', x):
+            x = x.replace('.', '')
+        return float(x.replace(',', '.'))
+    return float(x)
+
+
 def load_data_from_text(text_content):
-    """Carga datos desde texto CSV"""
+    """Carga datos desde texto CSV (separa la columna opcional de volumen)"""
     try:
-        df = pd.read_csv(io.StringIO(text_content), sep=';', index_col=0, encoding='utf-8-sig')
+        # Leer todo como texto: la inferencia de pandas convertiría "850.000" en 850.0
+        # antes de que parse_volume pueda interpretar el separador de miles
+        df = pd.read_csv(io.StringIO(text_content), sep=';', index_col=0, encoding='utf-8-sig', dtype=str)
+        
+        volumen = None
+        volume_cols = [c for c in df.columns if str(c).strip().lower() == VOLUME_COLUMN]
+        if volume_cols:
+            volumen = df[volume_cols[0]].map(parse_volume)
+            df = df.drop(columns=volume_cols)
+            # Columna sin valores: se trata como si no hubiera volumen (cartera sin ponderar)
+            if volumen.isna().all():
+                volumen = None
+        
         # Usar applymap (compatible con pandas en PyScript/Pyodide)
         df = df.applymap(parse_pct)
-        return df, None
+        return df, volumen, None
     except Exception as e:
-        return None, str(e)
+        return None, None, str(e)
 
 
 def create_mob_dataframe(df):
@@ -145,6 +179,106 @@ def project_cohort(df_pivot, factors, cohorte, mob_objetivo):
     return pd.DataFrame(proyeccion), None
 
 
+def date_to_ordinal(fecha):
+    """Convierte fecha YYYY-MM a ordinal de meses (año * 12 + mes - 1)"""
+    return int(fecha[:4]) * 12 + int(fecha[5:7]) - 1
+
+
+def ordinal_to_date(ordinal):
+    """Convierte ordinal de meses a fecha YYYY-MM"""
+    return f"{ordinal // 12}-{ordinal % 12 + 1:02d}"
+
+
+def project_all_cohorts(df_pivot, factors, mob_objetivo, carry_forward=False):
+    """Proyecta todas las cohortes a la vez hasta el MOB objetivo.
+    
+    Devuelve una matriz (cohortes x MOB 0..mob_objetivo) con la mora proyectada
+    y una máscara que marca las celdas proyectadas, con la misma lógica que
+    `project_cohort` (los MOB sin factor no generan proyección). Con
+    `carry_forward`, los MOB sin factor mantienen el último valor (factor 1.0).
+    """
+    max_mob = max(mob_objetivo, int(df_pivot.columns.max()))
+    values = df_pivot.reindex(columns=range(max_mob + 1)).to_numpy(dtype=float)
+    observed = ~np.isnan(values)
+    
+    # Último MOB observado y su valor, por cohorte
+    last_mob = max_mob - np.argmax(observed[:, ::-1], axis=1)
+    current = values[np.arange(len(values)), last_mob]
+    
+    mobs = np.arange(mob_objetivo + 1)
+    factor_vec = np.array([factors.get(m, np.nan) for m in mobs], dtype=float)
+    has_factor = ~np.isnan(factor_vec)
+    
+    mask = mobs[None, :] > last_mob[:, None]
+    if not carry_forward:
+        mask &= has_factor[None, :]
+    proyeccion = np.full((len(values), len(mobs)), np.nan)
+    for mob in mobs[1:]:
+        active = mask[:, mob]
+        if has_factor[mob]:
+            current = np.where(active, current * factor_vec[mob], current)
+        proyeccion[active, mob] = current[active]
+    
+    return proyeccion, mask
+
+
+def aggregate_portfolio(df_pivot, proyeccion, mask, ultimo_periodo, volumen=None,
+                        horizonte=PORTFOLIO_HORIZON):
+    """Agrega la mora proyectada de todas las cohortes por mes calendario futuro.
+    
+    Agrupa por ordinal de mes (cohorte + MOB) con `np.bincount`; si hay
+    volumen, la mora de cartera se pondera por el volumen de cada cohorte.
+    """
+    cohort_ord = np.array([date_to_ordinal(c) for c in df_pivot.index])
+    calendar_ord = cohort_ord[:, None] + np.arange(mask.shape[1])[None, :]
+    
+    # Sólo los `horizonte` meses posteriores al último período observado de la cartera.
+    # Decisión deliberada: si una cohorte dejó de observarse antes de ese período, su
+    # proyección para los meses intermedios se descarta (no se muestra), pero los meses
+    # futuros siguen encadenando desde esos valores intermedios.
+    last_obs_ord = date_to_ordinal(ultimo_periodo)
+    mask = mask & (calendar_ord > last_obs_ord) & (calendar_ord <= last_obs_ord + horizonte)
+    
+    if volumen is not None:
+        weights = volumen.reindex(df_pivot.index).fillna(0).to_numpy(dtype=float)
+    else:
+        weights = np.ones(len(df_pivot))
+    
+    rows, cols = np.nonzero(mask)
+    idx = calendar_ord[rows, cols] - (last_obs_ord + 1)
+    w = weights[rows]
+    n_months = int(idx.max()) + 1 if len(idx) > 0 else 0
+    
+    # Con volumen, sólo cuentan las cohortes que aportan peso a la mora ponderada
+    n_cohortes = np.bincount(idx, weights=(w > 0), minlength=n_months).astype(int)
+    peso = np.bincount(idx, weights=w, minlength=n_months)
+    mora_ponderada = np.bincount(idx, weights=w * proyeccion[rows, cols], minlength=n_months)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mora_pct = np.where(peso > 0, mora_ponderada / peso, np.nan)
+    
+    df_cartera = pd.DataFrame({
+        'fecha': [ordinal_to_date(last_obs_ord + 1 + i) for i in range(n_months)],
+        'cohortes_activas': n_cohortes,
+        'mora_pct': mora_pct
+    })
+    if volumen is not None:
+        df_cartera.insert(2, 'volumen', peso)
+    
+    return df_cartera[df_cartera['cohortes_activas'] > 0].reset_index(drop=True)
+
+
+def project_portfolio(df_pivot, factors, ultimo_periodo, volumen=None, horizonte=PORTFOLIO_HORIZON):
+    """Proyecta la mora de cartera para los próximos `horizonte` meses calendario"""
+    # MOB que alcanza la cohorte más antigua al final del horizonte
+    first_cohort_ord = min(date_to_ordinal(c) for c in df_pivot.index)
+    mob_horizonte = date_to_ordinal(ultimo_periodo) + horizonte - first_cohort_ord
+    
+    # Las cohortes maduras (sin factores para su MOB) mantienen su última mora
+    proyeccion, mask = project_all_cohorts(df_pivot, factors, mob_horizonte, carry_forward=True)
+    return aggregate_portfolio(df_pivot, proyeccion, mask, ultimo_periodo, volumen, horizonte)
+
+
 # ============================================================
 # FUNCIONES DE VISUALIZACIÓN
 # ============================================================
@@ -300,6 +434,48 @@ def create_factors_plot():
     window.Plotly.newPlot('plotFactores', traces_js, layout_js)
 
 
+def create_portfolio_plot():
+    """Crea gráfico de mora de cartera por mes calendario"""
+    df_cartera = data_store['df_cartera']
+    ponderado = 'volumen' in df_cartera.columns
+    
+    traces = [
+        {
+            'x': df_cartera['fecha'].tolist(),
+            'y': df_cartera['cohortes_activas'].tolist(),
+            'type': 'bar',
+            'name': 'Cohortes activas',
+            'yaxis': 'y2',
+            'marker': {'color': 'lightgray'},
+            'opacity': 0.5
+        },
+        {
+            'x': df_cartera['fecha'].tolist(),
+            # NaN no es JSON válido para el navegador; None se dibuja como hueco
+            'y': [v if pd.notna(v) else None for v in df_cartera['mora_pct']],
+            'type': 'scatter',
+            'mode': 'lines+markers',
+            'name': 'Mora cartera' + (' (ponderada)' if ponderado else ''),
+            'line': {'color': 'coral', 'width': 3, 'dash': 'dash'},
+            'marker': {'size': 8, 'symbol': 'square'}
+        }
+    ]
+    
+    layout = {
+        'title': 'Proyección de Mora de Cartera por Mes Calendario',
+        'xaxis': {'title': 'Mes Calendario', 'type': 'category'},
+        'yaxis': {'title': 'Mora >90d (%)'},
+        'yaxis2': {'title': 'Cohortes activas', 'overlaying': 'y', 'side': 'right', 'showgrid': False},
+        'hovermode': 'x unified',
+        'height': 500,
+        'template': 'plotly_white'
+    }
+    
+    traces_js = window.JSON.parse(json.dumps(traces))
+    layout_js = window.JSON.parse(json.dumps(layout))
+    window.Plotly.newPlot('plotCartera', traces_js, layout_js)
+
+
 # ============================================================
 # FUNCIONES DE TABLA
 # ============================================================
@@ -367,6 +543,32 @@ def create_summary_table():
     document.getElementById('tablaResumen').innerHTML = html
 
 
+def create_portfolio_table():
+    """Crea tabla de mora de cartera por mes calendario"""
+    df_cartera = data_store['df_cartera']
+    ponderado = 'volumen' in df_cartera.columns
+    
+    html = '<table><thead><tr>'
+    html += '<th>Mes Calendario</th><th>Cohortes Activas</th>'
+    if ponderado:
+        html += '<th>Volumen</th>'
+    html += '<th>Mora Proyectada</th>'
+    html += '</tr></thead><tbody>'
+    
+    for _, row in df_cartera.iterrows():
+        html += '<tr class="proyectado">'
+        html += f'<td>{row["fecha"]}</td>'
+        html += f'<td>{row["cohortes_activas"]}</td>'
+        if ponderado:
+            html += f'<td>{row["volumen"]:,.0f}</td>'
+        html += f'<td>{row["mora_pct"]:.2f}%</td>' if pd.notna(row['mora_pct']) else '<td>-</td>'
+        html += '</tr>'
+    
+    html += '</tbody></table>'
+    
+    document.getElementById('tablaCartera').innerHTML = html
+
+
 def create_factors_table():
     """Crea tabla de factores"""
     factors_detail = data_store['factors_detail']
@@ -414,6 +616,32 @@ def create_export_table():
     document.getElementById('tablaExport').innerHTML = html
 
 
+def create_portfolio_export_table():
+    """Crea tabla de export preview de cartera"""
+    df_cartera = data_store['df_cartera']
+    ponderado = 'volumen' in df_cartera.columns
+    
+    html = '<table><thead><tr>'
+    html += '<th>Fecha</th><th>Cohortes Activas</th>'
+    if ponderado:
+        html += '<th>Volumen</th>'
+    html += '<th>Mora %</th>'
+    html += '</tr></thead><tbody>'
+    
+    for _, row in df_cartera.iterrows():
+        html += '<tr>'
+        html += f'<td>{row["fecha"]}</td>'
+        html += f'<td>{row["cohortes_activas"]}</td>'
+        if ponderado:
+            html += f'<td>{row["volumen"]:,.0f}</td>'
+        html += f'<td>{row["mora_pct"]:.2f}%</td>' if pd.notna(row['mora_pct']) else '<td>-</td>'
+        html += '</tr>'
+    
+    html += '</tbody></table>'
+    
+    document.getElementById('tablaExportCartera').innerHTML = html
+
+
 # ============================================================
 # ACTUALIZACIÓN DE MÉTRICAS
 # ============================================================
@@ -461,7 +689,7 @@ def handle_file_upload(event):
             text_content = e.target.result
             
             # Cargar datos
-            df, error = load_data_from_text(text_content)
+            df, volumen, error = load_data_from_text(text_content)
             
             if error:
                 status = document.getElementById('fileStatus')
@@ -474,6 +702,7 @@ def handle_file_upload(event):
             
             # Guardar en store
             data_store['df'] = df
+            data_store['volumen'] = volumen
             data_store['df_mob'] = create_mob_dataframe(df)
             data_store['df_pivot'] = data_store['df_mob'].pivot(
                 index='cohorte', columns='mob', values='mora_pct'
@@ -484,9 +713,22 @@ def handle_file_upload(event):
             
             console.log(f'✅ Factores calculados: {len(data_store["factors"])} MOBs')
             
+            # Proyección de cartera (todas las cohortes), independiente de la cohorte elegida
+            data_store['df_cartera'] = project_portfolio(
+                data_store['df_pivot'],
+                data_store['factors'],
+                max(df.columns),
+                volumen
+            )
+            
             # Actualizar UI
             status = document.getElementById('fileStatus')
             status.textContent = f'✓ Archivo cargado: {file.name} ({len(df)} cohortes)'
+            if volumen is not None:
+                status.textContent += ' - con volumen'
+                sin_volumen = int((volumen.reindex(df.index).fillna(0) <= 0).sum())
+                if sin_volumen > 0:
+                    status.textContent += f' (⚠ {sin_volumen} cohortes sin volumen, excluidas de la cartera)'
             status.className = 'file-status success'
             
             # Ocultar instrucciones
@@ -583,12 +825,15 @@ def handle_projection(event):
         create_projection_plot()
         create_bar_chart()
         create_factors_plot()
+        create_portfolio_plot()
         
         # Crear tablas
         create_detailed_table()
         create_summary_table()
         create_factors_table()
+        create_portfolio_table()
         create_export_table()
+        create_portfolio_export_table()
         
         # Mostrar resultados
         document.getElementById('loadingSpinner').style.display = 'none'
@@ -615,6 +860,23 @@ def handle_export_csv(event):
     URL.revokeObjectURL(url)
 
 
+def handle_export_cartera_csv(event):
+    """Exporta la proyección de cartera a CSV"""
+    df_cartera = data_store['df_cartera']
+    
+    csv_text = df_cartera.to_csv(index=False)
+    
+    blob = Blob.new([csv_text], {'type': 'text/csv'})
+    url = URL.createObjectURL(blob)
+    
+    a = document.createElement('a')
+    a.href = url
+    a.download = 'proyeccion_cartera.csv'
+    a.click()
+    
+    URL.revokeObjectURL(url)
+
+
 def handle_export_excel(event):
     """Exporta a Excel (simulado como CSV por limitaciones de PyScript)"""
     # En PyScript, openpyxl no está disponible, así que exportamos como CSV
@@ -649,6 +911,10 @@ def init():
         'click', create_proxy(handle_export_csv)
     )
     
+    document.getElementById('exportCartera').addEventListener(
+        'click', create_proxy(handle_export_cartera_csv)
+    )
+    
     document.getElementById('exportExcel').addEventListener(
         'click', create_proxy(handle_export_excel)
     )
@@ -0,0 +1,36 @@
+"""
+Configuración de tests: `app.py` importa los módulos `js` y `pyodide`, que sólo
+existen dentro del navegador. Se reemplazan por mocks para poder probar las
+funciones de procesamiento con Python estándar.
+"""
+
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.modules.setdefault('js', mock.MagicMock())
+sys.modules.setdefault('pyodide', mock.MagicMock())
+sys.modules.setdefault('pyodide.ffi', mock.MagicMock())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+CSV_EJEMPLO = """;2024-01;2024-02;2024-03;2024-04;2024-05;volumen
+2024-01;2,0%;3,0%;4,0%;5,0%;6,0%;850.000
+2024-02;;1,0%;2,0%;3,0%;
+2024-03;;;1,5%;2,5%;3,5%;1200000
+2024-04;;;;1,0%;2,2%;300.000
+"""
+
+
+@pytest.fixture
+def cartera():
+    """Datos de ejemplo procesados como en la carga de archivo"""
+    df, volumen, error = app.load_data_from_text(CSV_EJEMPLO)
+    assert error is None
+    df_pivot = app.create_mob_dataframe(df).pivot(index='cohorte', columns='mob', values='mora_pct')
+    factors, _ = app.calculate_development_factors(df_pivot)
+    return df, volumen, df_pivot, factors
@@ -0,0 +1,110 @@
+import json
+from unittest import mock
+
+import numpy as np
+
+import app
+from conftest import CSV_EJEMPLO
+
+
+def test_parse_volume_formatos():
+    assert app.parse_volume('1.250.000') == 1250000.0
+    assert app.parse_volume('1250000') == 1250000.0
+    assert app.parse_volume('95,5') == 95.5
+    assert app.parse_volume('1.250.000,75') == 1250000.75
+    assert app.parse_volume('1250000.50') == 1250000.5
+    assert app.parse_volume('95.5') == 95.5
+    assert np.isnan(app.parse_volume(''))
+
+
+def test_load_volumen_formatos_mixtos():
+    df, volumen, error = app.load_data_from_text(CSV_EJEMPLO)
+    assert error is None
+    assert 'volumen' not in df.columns
+    assert volumen['2024-01'] == 850000.0
+    assert np.isnan(volumen['2024-02'])
+    assert volumen['2024-03'] == 1200000.0
+    assert volumen['2024-04'] == 300000.0
+
+
+def test_date_ordinal_ida_y_vuelta():
+    assert app.date_to_ordinal('2024-01') == 2024 * 12
+    assert app.ordinal_to_date(app.date_to_ordinal('2023-12') + 1) == '2024-01'
+
+
+def test_cartera_horizonte_fijo(cartera):
+    df, volumen, df_pivot, factors = cartera
+    df_cartera = app.project_portfolio(df_pivot, factors, max(df.columns), volumen, horizonte=3)
+    assert df_cartera['fecha'].tolist() == ['2024-06', '2024-07', '2024-08']
+
+
+def test_cartera_incluye_cohortes_sin_factor(cartera):
+    df, volumen, df_pivot, factors = cartera
+    df_cartera = app.project_portfolio(df_pivot, factors, max(df.columns), horizonte=3)
+    # 2024-01 ya pasó el último factor (MOB 4) y debe seguir contando con su última mora
+    assert (df_cartera['cohortes_activas'] == len(df_pivot)).all()
+    proyeccion, mask = app.project_all_cohorts(df_pivot, factors, 7, carry_forward=True)
+    assert mask[0, 5:].all()
+    assert np.allclose(proyeccion[0, 5:], df_pivot.loc['2024-01', 4])
+
+
+def test_project_all_cohorts_equivale_a_project_cohort(cartera):
+    _, _, df_pivot, factors = cartera
+    for mob_objetivo in (2, 4, 8):
+        proyeccion, mask = app.project_all_cohorts(df_pivot, factors, mob_objetivo)
+        for i, cohorte in enumerate(df_pivot.index):
+            df_proy, error = app.project_cohort(df_pivot, factors, cohorte, mob_objetivo)
+            assert error is None
+            proyectado = df_proy[df_proy['tipo'] == 'Proyectado']
+            assert np.flatnonzero(mask[i]).tolist() == proyectado['mob'].tolist()
+            assert np.allclose(proyeccion[i, proyectado['mob']], proyectado['mora_pct'])
+
+
+def test_aggregate_portfolio_ponderado(cartera):
+    df, volumen, df_pivot, factors = cartera
+    proyeccion, mask = app.project_all_cohorts(df_pivot, factors, 8, carry_forward=True)
+    df_cartera = app.aggregate_portfolio(df_pivot, proyeccion, mask, max(df.columns), volumen, horizonte=1)
+
+    # 2024-06: MOB 5, 4, 3 y 2 de cada cohorte; 2024-02 no tiene volumen y queda fuera
+    moras = [proyeccion[i, mob] for i, mob in enumerate([5, 4, 3, 2])]
+    pesos = volumen.fillna(0).tolist()
+    fila = df_cartera.iloc[0]
+    assert fila['fecha'] == '2024-06'
+    assert fila['cohortes_activas'] == 3
+    assert fila['volumen'] == sum(pesos)
+    assert np.isclose(fila['mora_pct'], np.average(moras, weights=pesos))
+
+    sin_peso = app.aggregate_portfolio(df_pivot, proyeccion, mask, max(df.columns), horizonte=1)
+    assert 'volumen' not in sin_peso.columns
+    assert sin_peso['cohortes_activas'].iloc[0] == 4
+    assert np.isclose(sin_peso['mora_pct'].iloc[0], np.mean(moras))
+
+
+def _json_estricto(texto):
+    """Rechaza NaN/Infinity igual que JSON.parse del navegador"""
+    def rechazar(constante):
+        raise ValueError(f'JSON inválido: {constante}')
+    return json.loads(texto, parse_constant=rechazar)
+
+
+def test_volumen_vacio_no_rompe_grafico_cartera(cartera, monkeypatch):
+    csv_sin_volumen = CSV_EJEMPLO.replace('850.000', '').replace('1200000', '').replace('300.000', '')
+    df, volumen, error = app.load_data_from_text(csv_sin_volumen)
+    assert error is None
+    assert volumen is None
+
+    _, _, df_pivot, factors = cartera
+    df_cartera = app.project_portfolio(df_pivot, factors, max(df.columns), volumen)
+    assert df_cartera['mora_pct'].notna().all()
+
+    window = mock.MagicMock()
+    window.JSON.parse.side_effect = _json_estricto
+    monkeypatch.setattr(app, 'window', window)
+    monkeypatch.setitem(app.data_store, 'df_cartera', df_cartera)
+    app.create_portfolio_plot()
+
+    # Un mes sin mora (NaN) se envía como null
+    df_cartera.loc[0, 'mora_pct'] = np.nan
+    app.create_portfolio_plot()
+    traces = window.JSON.parse.call_args_list[-2].args[0]
+    assert _json_estricto(traces)[1]['y'][0] is None